@@ -15,6 +15,8 @@ def degree_centrality_scores(
     similarity_matrix,
     threshold=None,
     increase_power=True,
+    top_k=None,
+    patience=None,
 ):
     if not (
         threshold is None
@@ -39,18 +41,23 @@ def degree_centrality_scores(
         markov_matrix,
         increase_power=increase_power,
         normalized=False,
+        top_k=top_k,
+        patience=patience,
     )
 
     return scores
 
 
-def _power_method(transition_matrix, increase_power=True, max_iter=10000):
+def _power_method(transition_matrix, increase_power=True, max_iter=10000, top_k=None, patience=None):
     eigenvector = np.ones(len(transition_matrix))
 
     if len(eigenvector) == 1:
         return eigenvector
 
     transition = transition_matrix.transpose()
+    early_exit = top_k is not None and patience is not None
+    top_set = None
+    stable = 0
 
     for _ in range(max_iter):
         eigenvector_next = np.dot(transition, eigenvector)
@@ -58,9 +65,22 @@ def _power_method(transition_matrix, increase_power=True, max_iter=10000):
         if np.allclose(eigenvector_next, eigenvector):
             return eigenvector_next
 
+        # only the top-k set is needed: stop once it stops changing
+        if early_exit:
+            top_next = set(np.argsort(-eigenvector_next)[:top_k])
+            if top_next == top_set:
+                stable += 1
+                if stable >= patience:
+                    return eigenvector_next
+            else:
+                top_set = top_next
+                stable = 0
+
         eigenvector = eigenvector_next
 
-        if increase_power:
+        # squaring costs O(n^3) per iteration; with an early exit the
+        # plain O(n^2) iteration is much cheaper
+        if increase_power and not early_exit:
             transition = np.dot(transition, transition)
 
     logger.warning("Maximum number of iterations for power method exceeded without convergence!")
@@ -105,6 +125,8 @@ def stationary_distribution(
     transition_matrix,
     increase_power=True,
     normalized=True,
+    top_k=None,
+    patience=None,
 ):
     n_1, n_2 = transition_matrix.shape
     if n_1 != n_2:
@@ -113,10 +135,20 @@ def stationary_distribution(
     distribution = np.zeros(n_1)
 
     grouped_indices = connected_nodes(transition_matrix)
+    # an early-exited vector is not converged, so its values cannot be
+    # compared with those of other groups
+    if len(grouped_indices) > 1:
+        top_k = None
+        patience = None
 
     for group in grouped_indices:
         t_matrix = transition_matrix[np.ix_(group, group)]
-        eigenvector = _power_method(t_matrix, increase_power=increase_power)
+        eigenvector = _power_method(
+            t_matrix,
+            increase_power=increase_power,
+            top_k=top_k,
+            patience=patience,
+        )
         distribution[group] = eigenvector
 
     if normalized:
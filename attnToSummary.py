@@ -15,15 +15,34 @@ Module to conduct the following tasks:
     - check if rus words in the summary;
     - create a dummy and add it to the summary table
 
+In cascade mode, the density of dict words/phrases in the text settles the
+clear negatives and positives; the borderline forms go through the
+summarisers from the cheapest to the most expensive, and one stops at the
+first summariser that agrees with what the density suggests. The tier that
+settles every form is saved in the column "attn_tier".
+
 STRUCTURE
 ---------
 -<class> AttentionToSummary
+| -<method> _get_file_paths
+| -<method> _filing_size
+| -<property> summariser
+| -<method> _get_summariser
+| -<method> _read_text
+| -<method> _summary_label
+| -<method> _assign_with_stats
 | -<method> _assign_dummy2single_form
 | -<method> assign_in_batch
+| -<method> _finalise
+| -<method> tier_report
 | -<method> threading
+| -<method> supervised
+| -<method> supervised_batch
+-<func> _build_worker
 -<END>
 
 '''
+import os
 import re
 import pandas as pd
 import spacy
@@ -34,8 +53,17 @@ from spacySum import SpacySummariser
 from lexrankSum import LexRankSummariser
 from finSum import FinanceSummariser
 from joblib import Parallel, delayed
+from memGuard import MemoryBoundedPool
 from spacy.lang.en.stop_words import STOP_WORDS
-from utils import load_dicts, phrase_in_text
+from utils import load_dicts
+from textNorm import clean_text, count_sentences
+from tokenMatch import PhraseMatcher
+
+SUMMARISERS = {
+    'spacy': SpacySummariser,
+    'lexrank': LexRankSummariser,
+    'finance': FinanceSummariser,
+    }
 
 class AttentionToSummary:
     def __init__(
@@ -44,12 +72,16 @@ class AttentionToSummary:
             dict_path_list:list,
             store_path:str,
             form_type: str,
+            summariser: str = 'spacy',
+            cascade: list = None,
+            density_range: tuple = (0.1, 2.),
+            summariser_kwargs: dict = None,
             ):
         '''
         Parametres
         ----------
         summary_path: str
-            The path to summary excel file.
+            The path to summary excel (or csv) file.
         dict_path_list: list
             A list of dicts to be used to detect if the text
             if Russian-related.
@@ -62,10 +94,41 @@ class AttentionToSummary:
                 - 10-Q
                 - 10-K_Item1A
                 - 10-K_Item7
+        summariser: str
+            The summariser to use, one of 'spacy', 'lexrank'
+            and 'finance'. Ignored in cascade mode.
+        cascade: list
+            If given, use cascade mode with these summarisers, from
+            the cheapest to the most expensive, e.g. ['spacy', 'lexrank'].
+        density_range: tuple
+            In cascade mode, forms with fewer dict words/phrases per
+            1000 words than the lower bound are assigned 0, and those
+            with at least the upper bound are assigned 1.
+        summariser_kwargs: dict
+            Kwargs to initialise the summarisers, by name, e.g.
+            {'lexrank': {'k': 5, 'patience': 3}}.
         '''
+        if cascade is not None and len(cascade) == 0:
+            raise ValueError('cascade should have at least one summariser')
+        if not density_range[0] <= density_range[1]:
+            raise ValueError(
+                'density_range should be (low, high) with low <= high, got {}'.format(density_range)
+                )
+        for name in ([summariser] if cascade is None else cascade):
+            if name not in SUMMARISERS:
+                raise ValueError(
+                    'Unknown summariser {}; should be one of {}'.format(name, list(SUMMARISERS))
+                    )
 
-        # read the summary excel file as a pandas df
-        df = pd.read_excel(summary_path)
+        # read the summary excel (or csv) file as a pandas df
+        if summary_path.endswith('.csv'):
+            # keep f_date as datetime, as read_excel does for 10-Q
+            df = pd.read_csv(
+                summary_path,
+                parse_dates=['f_date'] if form_type == '10-Q' else None,
+                )
+        else:
+            df = pd.read_excel(summary_path)
         # get the list of adrs columns
         adrs_names = [
             adrs_name
@@ -84,10 +147,17 @@ class AttentionToSummary:
             'f_date',
             ]
         
-        # initialise summariser
-        self.summariser = SpacySummariser()
+        # summarisers are loaded when first needed: in cascade mode the
+        # expensive ones may be rarely used, and in supervised or sharded
+        # runs only the workers need them
+        self.summarisers = {}
+        self.cascade = cascade
+        self.density_range = density_range
+        self.summariser_kwargs = summariser_kwargs or {}
         # import the words of all dicts as a list
         self.dict_phrases = load_dicts(dict_path_list)
+        self.matcher = PhraseMatcher(self.dict_phrases)
+        self.summariser_name = summariser if cascade is None else None
         # drop all other columns except basic info and adrs
         self.df = df.loc[:, basic_info + adrs_names]
         # add attributes for future use
@@ -95,27 +165,61 @@ class AttentionToSummary:
         self.items = items
         self.form_type = form_type
         self.store_path = store_path
+        # keep the args so that worker processes can rebuild the object
+        self.init_args = (
+            summary_path, dict_path_list, store_path, form_type,
+            summariser, cascade, density_range, summariser_kwargs,
+            )
     
-    def _assign_dummy2single_form(self, idx:int):
+    def _get_file_paths(self, idx:int)->list:
         '''
-        Get the value of the dummy for a single form
-
-        Parametres
-        ----------
-        idx: int
-            The index of the form in the summary df
-        
-        Return
-        ------
-        0 if no Russian-related words/phrases are detected,
-        else 1.
+        Get the paths of items that are extracted successfully
+        for a single form.
         '''
-        # get the paths of items that are extracted successfully
-        file_paths = [
+        return [
             self.store_path + path
             for path in list(self.df.loc[idx, self.adrs_names])
             if not isinstance(path, float) and len(path) >= 10
             ]
+    
+    def _filing_size(self, idx:int)->int:
+        '''
+        Get the total size in bytes of the item files of a single form.
+        '''
+        size = 0
+        for path in self._get_file_paths(idx):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+    
+    @property
+    def summariser(self):
+        '''
+        The summariser in use; None in cascade mode.
+        '''
+        if self.summariser_name is None:
+            return None
+        return self._get_summariser(self.summariser_name)
+    
+    def _get_summariser(self, name:str):
+        if name not in self.summarisers:
+            kwargs = dict(self.summariser_kwargs.get(name, {}))
+            # LexRank skips the texts no summary of which can have a dict
+            # word/phrase, and restricting the candidate sentences needs the dicts
+            if name == 'lexrank':
+                kwargs['dict_phrases'] = self.dict_phrases
+            self.summarisers[name] = SUMMARISERS[name](**kwargs)
+        return self.summarisers[name]
+    
+    def _read_text(self, idx:int)->str:
+        '''
+        Read and concat the texts of all items in a single form,
+        and clean the text.
+        '''
+        # get the paths of items that are extracted successfully
+        file_paths = self._get_file_paths(idx)
         
         # read the texts from paths
         text = ''
@@ -129,29 +233,83 @@ class AttentionToSummary:
                 with open(path, 'r', encoding='gbk') as f:
                     text += f.read() + ' '
         # simple pre-processing
-        text = re.sub(r'\n+', '. ', text)
-        text = re.sub(r'\s{2,}', '', text)
-
+        text = clean_text(text)
+        if len(text) > 1000000:
+            text = text[:1000000]
+        return text
+    
+    def _summary_label(self, name:str, text:str)->int:
+        '''
+        1 if Russian-related words/phrases are detected in the summary
+        given by the summariser, else 0.
+        '''
+        # use summariser to get the summary  
+        summary = self._get_summariser(name)._summarise(text)
+        if self.matcher.contains(self.matcher.encode(summary)):
+            return 1
+        else: return 0
+    
+    def _assign_with_stats(self, idx:int)->tuple:
+        '''
+        Get the value of the dummy for a single form, the tier that
+        settles it ('empty', 'density' or the name of a summariser),
+        and the rough num of sentences in the form.
+        '''
+        text = self._read_text(idx)
         # ensure the text has meaningful contents
-        if len(text) > 0:
-            if len(text) > 1000000:
-                text = text[:1000000]
-            # use summariser to get the summary  
-            text = self.summariser._summarise(text)
-            if phrase_in_text(self.dict_phrases, text):
-                return 1
-            else: return 0
-        else:
-            return 0
+        if len(text) == 0:
+            return 0, 'empty', 0
+        n_sents = count_sentences(text)
+        if self.cascade is None:
+            value = self._summary_label(self.summariser_name, text)
+            return value, self.summariser_name, n_sents
+        
+        # density of dict words/phrases per 1000 words
+        doc = self.matcher.encode(text, cleaned=True)
+        if len(doc) == 0:
+            return 0, 'empty', n_sents
+        density = self.matcher.count(doc) / len(doc) * 1000
+        low, high = self.density_range
+        if density < low:
+            return 0, 'density', n_sents
+        if density >= high:
+            return 1, 'density', n_sents
+        
+        # borderline: escalate until a summariser agrees with the density
+        lean = int(density >= (low + high) / 2)
+        for name in self.cascade[:-1]:
+            value = self._summary_label(name, text)
+            if value == lean:
+                return value, name, n_sents
+        return self._summary_label(self.cascade[-1], text), self.cascade[-1], n_sents
+    
+    def _assign_dummy2single_form(self, idx:int):
+        '''
+        Get the value of the dummy for a single form
+
+        Parametres
+        ----------
+        idx: int
+            The index of the form in the summary df
+        
+        Return
+        ------
+        0 if no Russian-related words/phrases are detected,
+        else 1.
+        '''
+        return self._assign_with_stats(idx)[0]
     
-    def assign_in_batch(self,_range:list):
+    def assign_in_batch(self,_range:list, callback = None):
         '''
         Obtain the values of the dummy in a large batch of forms.
 
-        Parametre
-        ---------
+        Parametres
+        ----------
         _range: list
             A list of indeces of forms in a summary df.
+        callback: callable
+            If given, called with (idx, value, tier, n_sentences)
+            as soon as a form is done.
         
         Return
         ------
@@ -160,7 +318,12 @@ class AttentionToSummary:
         '''
         df = self.df.loc[_range,:]
         for idx in _range:
-            df.loc[idx,'rus_attn'] = self._assign_dummy2single_form(idx)
+            value, tier, n_sents = self._assign_with_stats(idx)
+            df.loc[idx,'rus_attn'] = value
+            if self.cascade is not None:
+                df.loc[idx,'attn_tier'] = tier
+            if callback is not None:
+                callback(idx, value, tier, n_sents)
         return df
     
     def threading(self, jobs:int):
@@ -196,6 +359,23 @@ class AttentionToSummary:
         output = pd.DataFrame()
         for sub_df in output_dfs:
             output = pd.concat([output, sub_df])
+     
+        return self._finalise(output)
+    
+    def _finalise(self, output):
+        '''
+        Drop empty records, sort by CIK and date, and refine f_date.
+
+        Parametre
+        ---------
+        output: pandas df
+            Fraction(s) of summary df with the column "rus_attn"
+        
+        Return
+        ------
+        output: pandas df
+            The cleaned df
+        '''
         output.reset_index(drop=True, inplace=True)
         
         # drop empty records
@@ -218,6 +398,104 @@ class AttentionToSummary:
             output['f_date'] = [re.sub('/', '-', date) for date in output['f_date']]
      
         return output
+    
+    def tier_report(self, output):
+        '''
+        Report how the forms split across the tiers in cascade mode.
+
+        Parametre
+        ---------
+        output: pandas df
+            Summary df with the columns "rus_attn" and "attn_tier"
+        
+        Return
+        ------
+        report: pandas df
+            For every tier, the num and share of forms it settles
+            and the share of them assigned 1
+        '''
+        report = output.groupby('attn_tier')['rus_attn'].agg(['count', 'mean'])
+        report.columns = ['forms', 'rus_attn_share']
+        report.insert(1, 'share', report['forms'] / report['forms'].sum())
+        return report
+    
+    def supervised(self, jobs:int, **pool_kwargs):
+        '''
+        Employ worker processes under memory supervision. Unlike threading,
+        the num of filings processed at the same time is adapted to the
+        memory left on the node, very large filings are processed in a
+        low-parallelism lane, and workers passing a memory ceiling are
+        restarted without losing their filings.
 
+        Parametres
+        ----------
+        jobs: int
+            Max num of workers
+        pool_kwargs:
+            Passed to MemoryBoundedPool, e.g. mem_limit, worker_ceiling,
+            large_size, large_jobs.
+        
+        Return
+        ------
+        output: pandas df
+            Complete summary df with the column "rus_attn"; filings that
+            failed or were given up after repeated restarts are left empty.
+        '''
+        output = self.supervised_batch(list(self.df.index), jobs, **pool_kwargs)
+        
+        return self._finalise(output)
     
+    def supervised_batch(self, _range:list, jobs:int, callback = None, **pool_kwargs):
+        '''
+        Obtain the values of the dummy in a batch of forms with
+        worker processes under memory supervision.
+
+        Parametres
+        ----------
+        _range: list
+            A list of indeces of forms in a summary df.
+        jobs: int
+            Max num of workers
+        callback: callable
+            If given, called with (idx, value, tier, n_sentences)
+            as soon as a form is done; all None but idx if it failed
+            or was given up.
+        pool_kwargs:
+            Passed to MemoryBoundedPool.
         
+        Return
+        ------
+        df: pandas df
+            The fraction of summary df with the column "rus_attn"
+        '''
+        _range = list(_range)
+        sizes = [self._filing_size(idx) for idx in _range]
+        pool = MemoryBoundedPool(
+            _build_worker,
+            self.init_args,
+            jobs,
+            **pool_kwargs,
+            )
+        pool_callback = None
+        if callback is not None:
+            pool_callback = lambda idx, result: callback(idx, *(result or (None, None, None)))
+        results = pool.map(_range, sizes, callback=pool_callback)
+        
+        df = self.df.loc[_range,:].copy()
+        results = [results.get(idx) or (None, None, None) for idx in _range]
+        # float like assign_in_batch, with NaN for the forms failed or given up
+        df['rus_attn'] = pd.Series(
+            [value for value, _, _ in results],
+            index=df.index,
+            dtype=float,
+            )
+        if self.cascade is not None:
+            df['attn_tier'] = [tier for _, tier, _ in results]
+        return df
+
+def _build_worker(*init_args):
+    '''
+    Build an AttentionToSummary in a worker process and return
+    the func to process a single form.
+    '''
+    return AttentionToSummary(*init_args)._assign_with_stats
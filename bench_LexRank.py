@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the early exit of the LexRank power iteration against the
+full run. Prints the time per call and whether both give the same top-k.
+
+Then compares the labels (whether a sentence with dict words/phrases is in
+the top-k) given by the full graph, by the early exit, and by the graph
+restricted to the hit sentences plus n_sample others (the n_sample option
+of LexRankSummariser), over many random texts.
+'''
+import timeit
+import numpy as np
+from LexRank import degree_centrality_scores
+
+def make_similarity(n_sents:int, dim:int = 384, seed:int = 0):
+    '''
+    Cosine similarities of random unit vectors sharing a common
+    direction, like sentence embeddings of the same filing.
+    '''
+    rng = np.random.default_rng(seed)
+    emb = rng.normal(size=(n_sents, dim)) + 0.3 * rng.normal(size=dim)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    return emb @ emb.T
+
+def label(cos_scores, hits, k:int, **kwargs)->int:
+    '''
+    1 if a hit sentence is among the k most central sentences, else 0.
+    '''
+    scores = degree_centrality_scores(cos_scores, **kwargs)
+    return int(bool(set(hits) & set(np.argsort(-scores)[:k])))
+
+def label_agreement(
+        n_sents:int = 600,
+        n_hits:int = 4,
+        n_sample:int = 20,
+        k:int = 5,
+        n_seeds:int = 30,
+        )->dict:
+    '''
+    Num of positive labels of every method and num of texts on which
+    it agrees with the full graph.
+    '''
+    counts = {'full': [0, 0], 'patience': [0, 0], 'n_sample': [0, 0]}
+    for seed in range(n_seeds):
+        cos_scores = make_similarity(n_sents, seed=seed)
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(n_sents, size=n_hits + n_sample, replace=False)
+        hits = picked[:n_hits]
+        full = label(cos_scores, hits, k)
+        labels = {
+            'full': full,
+            'patience': label(cos_scores, hits, k, top_k=k, patience=3),
+            # hits come first in the restricted graph
+            'n_sample': label(
+                cos_scores[np.ix_(picked, picked)],
+                range(n_hits),
+                k,
+                ),
+            }
+        for name, value in labels.items():
+            counts[name][0] += value
+            counts[name][1] += value == full
+    return counts
+
+if __name__ == '__main__':
+    k = 5
+    for n_sents in [200, 1000, 3000]:
+        cos_scores = make_similarity(n_sents)
+        number = 3 if n_sents < 3000 else 1
+        full = degree_centrality_scores(cos_scores)
+        early = degree_centrality_scores(cos_scores, top_k=k, patience=3)
+        same = set(np.argsort(-full)[:k]) == set(np.argsort(-early)[:k])
+        t_full = timeit.timeit(lambda: degree_centrality_scores(cos_scores), number=number) / number
+        t_early = timeit.timeit(
+            lambda: degree_centrality_scores(cos_scores, top_k=k, patience=3),
+            number=number,
+            ) / number
+        print('{:>5} sentences | full: {:.3f}s | early exit: {:.3f}s ({:.1f}x) | same top-{}: {}'.format(
+            n_sents, t_full, t_early, t_full / t_early, k, same,
+            ))
+
+    n_seeds = 30
+    counts = label_agreement(k=k, n_seeds=n_seeds)
+    print('labels over {} texts of 600 sentences, 4 hit sentences, n_sample 20, k {}:'.format(n_seeds, k))
+    for name, (positive, agree) in counts.items():
+        print('{:>9} | positive: {:>2} | same as full graph: {}/{}'.format(
+            name, positive, agree, n_seeds,
+            ))
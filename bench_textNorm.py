@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the textNorm module against the old ad hoc clean-up.
+Checks that both give the same output and prints the time per call.
+'''
+import re
+import random
+import timeit
+from textNorm import clean_text, tokenize
+
+def old_clean_text(text:str)->str:
+    text = re.sub(r'\n+', '. ', text)
+    text = re.sub(r'\s{2,}', '', text)
+    return text
+
+def old_preprocess_text(text:str)->list:
+    text = re.sub(r'\n+', '. ', text)
+    text = re.sub(r'\s{2,}', '', text)
+    text = text.lower()
+    for punc in ['.',',','?','!',':',';']:
+        text = text.replace(punc, ' ')
+    return text.split()
+
+def make_text(n_chars:int, seed:int = 0)->str:
+    '''
+    Random text that looks like an extracted filing: words, puncts,
+    line breaks and runs of spaces.
+    '''
+    rng = random.Random(seed)
+    words = ['Russia', 'Ukraine', 'sanctions', 'revenue', 'the', 'of',
+             'Company', 'risk', 'Moscow', 'net', 'income', 'quarter']
+    seps = [' '] * 20 + ['. ', ', ', '; ', ':', '\n', '\n\n', '   ', ' \n ', '\t', '\r\n']
+    parts = []
+    length = 0
+    while length < n_chars:
+        part = rng.choice(words) + rng.choice(seps)
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)[:n_chars]
+
+if __name__ == '__main__':
+    for n_chars in [10000, 100000, 1000000]:
+        text = make_text(n_chars)
+        assert clean_text(text) == old_clean_text(text)
+        assert tokenize(text) == old_preprocess_text(text)
+
+        number = max(1, 1000000 // n_chars)
+        t_old_clean = timeit.timeit(lambda: old_clean_text(text), number=number) / number
+        t_new_clean = timeit.timeit(lambda: clean_text(text), number=number) / number
+        # summariser input and matcher tokens of the same text
+        t_old_both = timeit.timeit(
+            lambda: (old_clean_text(text), old_preprocess_text(text)),
+            number=number,
+            ) / number
+        t_new_both = timeit.timeit(
+            lambda: tokenize(clean_text(text), cleaned=True),
+            number=number,
+            ) / number
+
+        print('{:>8} chars | clean: {:.4f}s -> {:.4f}s ({:.1f}x) | clean + tokens: {:.4f}s -> {:.4f}s ({:.1f}x)'.format(
+            n_chars,
+            t_old_clean, t_new_clean, t_old_clean / t_new_clean,
+            t_old_both, t_new_both, t_old_both / t_new_both,
+            ))
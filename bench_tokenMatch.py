@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the tokenMatch module against the old list/Counter matching
+of the words of a text. Prints the time and the peak memory per call, and
+the memory held by the words of a filing as a list of str and as a
+TokenDoc. The old funcs are also the reference of test_tokenMatch.py.
+'''
+import sys
+import random
+import timeit
+import tracemalloc
+from collections import Counter
+from utils import load_dicts
+from textNorm import tokenize
+from tokenMatch import PhraseMatcher
+
+def old_phrase_in_words(dict_phrases:list, text_words:list)->bool:
+    words_counter = dict(Counter(text_words))
+    counter_keys = list(words_counter.keys())
+    for phrase in dict_phrases:
+        if len(phrase) == 1:
+            kw = phrase[0]
+            if '*' not in kw:
+                if phrase[0] in words_counter.keys():
+                    return True
+            else:
+                kw = kw.split("*")[0]
+                for key in counter_keys:
+                    if key[:len(kw)] == kw:
+                        return True
+        else:
+            for w_i in range(len(text_words)):
+                flag = True
+                for p_w_i, p_w in enumerate(phrase):
+                    if '*' not in p_w:
+                        if w_i + p_w_i >= len(text_words) or p_w != text_words[w_i + p_w_i]:
+                            flag = False
+                            break
+                    else:
+                        p_w = p_w.split('*')[0]
+                        if w_i + p_w_i >= len(text_words) or p_w != text_words[w_i + p_w_i][:len(p_w)]:
+                            flag = False
+                            break
+                if flag:
+                    return flag
+    return False
+
+def old_count_phrases(dict_phrases:list, text_words:list)->int:
+    words_counter = Counter(text_words)
+    count = 0
+    for phrase in dict_phrases:
+        if len(phrase) == 1:
+            kw = phrase[0]
+            if '*' not in kw:
+                count += words_counter.get(kw, 0)
+            else:
+                kw = kw.split('*')[0]
+                count += sum(
+                    n for key, n in words_counter.items()
+                    if key[:len(kw)] == kw
+                    )
+        else:
+            for w_i in range(len(text_words) - len(phrase) + 1):
+                flag = True
+                for p_w_i, p_w in enumerate(phrase):
+                    if '*' not in p_w:
+                        if p_w != text_words[w_i + p_w_i]:
+                            flag = False
+                            break
+                    else:
+                        p_w = p_w.split('*')[0]
+                        if p_w != text_words[w_i + p_w_i][:len(p_w)]:
+                            flag = False
+                            break
+                if flag:
+                    count += 1
+    return count
+
+def make_words(n_words:int, dict_phrases:list, hit_rate:float, seed:int = 0)->list:
+    '''
+    Random filing-like words, with dict words mixed in at the given rate.
+    '''
+    rng = random.Random(seed)
+    vocab = ['company{}'.format(i) for i in range(20000)] + \
+        ['the', 'of', 'and', 'risk', 'net', 'income', 'quarter', 'revenue']
+    dict_words = [w.replace('*', 'ed') for phrase in dict_phrases for w in phrase]
+    return [
+        rng.choice(dict_words) if rng.random() < hit_rate else rng.choice(vocab)
+        for _ in range(n_words)
+        ]
+
+def make_text(n_words:int, dict_phrases:list, hit_rate:float, seed:int = 0)->str:
+    '''
+    Random filing-like text from make_words, with capitals and puncts.
+    '''
+    rng = random.Random(seed)
+    words = make_words(n_words, dict_phrases, hit_rate, seed)
+    return ' '.join(
+        w.capitalize() + rng.choice(['.', ',', ';', '']) if rng.random() < 0.1 else w
+        for w in words
+        )
+
+def held_memory(text_words:list, doc)->tuple:
+    '''
+    Bytes held by the words of a text as a list of str, and as a TokenDoc.
+    '''
+    as_list = sys.getsizeof(text_words) + sum(sys.getsizeof(w) for w in set(text_words))
+    as_doc = sys.getsizeof(doc) + doc.pos.nbytes + doc.ids.nbytes
+    return as_list, as_doc
+
+def peak_memory(func)->int:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+if __name__ == '__main__':
+    dict_phrases = load_dicts(['rus_dict_lemma.txt', 'rus_names.txt'])
+    matcher = PhraseMatcher(dict_phrases)
+    # no hit is the worst case of phrase_in_text: every phrase is checked
+    for n_words, hit_rate in [(10000, 0.), (100000, 0.), (100000, 0.001)]:
+        text = make_text(n_words, dict_phrases, hit_rate)
+        old = lambda: old_count_phrases(dict_phrases, tokenize(text, cleaned=True))
+        new = lambda: matcher.count(matcher.encode(text, cleaned=True))
+        # the first call fills the cache of the matcher
+        new()
+
+        t_old = timeit.timeit(old, number=1)
+        t_new = timeit.timeit(new, number=3) / 3
+        m_old = peak_memory(old)
+        m_new = peak_memory(new)
+        h_list, h_doc = held_memory(
+            tokenize(text, cleaned=True),
+            matcher.encode(text, cleaned=True),
+            )
+        print('{:>7} words, hit rate {} | count: {:.3f}s -> {:.3f}s ({:.1f}x) | peak memory: {:.2f}MB -> {:.3f}MB | held: {:.2f}MB -> {:.4f}MB'.format(
+            n_words, hit_rate,
+            t_old, t_new, t_old / t_new,
+            m_old / 2**20, m_new / 2**20,
+            h_list / 2**20, h_doc / 2**20,
+            ))
+    print('matcher: {} dict words in the vocabulary, {} words in the cache'.format(
+        len(matcher.vocab), len(matcher.cache),
+        ))
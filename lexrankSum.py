@@ -21,6 +21,7 @@ References:
 STRUCTURE
 ---------
 -<class> LexRankSummariser
+| -<method> _candidates
 | -<method> _summarise
 -<END>
 
@@ -33,25 +34,95 @@ github page.
 
 '''
 
-import re
 import nltk
 import numpy as np
+from collections import Counter
 from LexRank import degree_centrality_scores
+from textNorm import clean_text, tokenize
+from utils import sentence_hits
+from tokenMatch import PhraseMatcher
 from sentence_transformers import SentenceTransformer, util
 
 class LexRankSummariser:
-    def __init__(self):
+    def __init__(
+            self,
+            k:int = 5,
+            patience:int = None,
+            n_sample:int = None,
+            dict_phrases:list = None,
+            ):
+        '''
+        Parametres
+        ----------
+        k: int
+            Num of sentences in the summary.
+        patience: int
+            If given, run the power iteration without squaring the matrix
+            and stop once the top-k sentences have not changed for this
+            many iterations.
+        n_sample: int
+            If given together with dict_phrases, only the sentences with
+            dict words/phrases plus the n_sample sentences with the
+            highest word-frequency scores are embedded and ranked. This is
+            APPROXIMATE: the centrality on the smaller graph differs from
+            the one on the full graph, and since the hit sentences make up
+            a much larger share of it, the summary contains them far more
+            often, i.e. the labels are biased toward 1. Leave it None to
+            keep the labels of the full graph.
+        dict_phrases: list
+            A list of dict words/phrases, generated by utils.load_dicts.
+            If given, a text in which no dict word/phrase has all its
+            words gets an empty summary at once: no summary of it could
+            contain one, so the label does not change.
+        '''
         self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.k = k
+        self.patience = patience
+        self.n_sample = n_sample
+        self.dict_phrases = dict_phrases
+        self.matcher = PhraseMatcher(dict_phrases) if dict_phrases is not None else None
+    
+    def _candidates(self, sentences:list)->list:
+        '''
+        Get the indices of the sentences with dict words/phrases, plus
+        a sample of other sentences ranked by the sum of their normalised
+        word frequencies (Luhn, 1958), in the order of the text.
+        '''
+        hits = sentence_hits(self.dict_phrases, sentences)
+        if len(hits) == 0:
+            return []
+        sent_words = [tokenize(sent, cleaned=True) for sent in sentences]
+        word_freq = Counter(w for words in sent_words for w in words)
+        max_freq = max(word_freq.values())
+        hit_set = set(hits)
+        scores = {
+            sent_i: sum(word_freq[w] for w in words) / max_freq
+            for sent_i, words in enumerate(sent_words)
+            if sent_i not in hit_set
+            }
+        sample = sorted(scores, key=scores.get, reverse=True)[:self.n_sample]
+        return sorted(hits + sample)
     
     def _summarise(self, text:str):
+        if self.matcher is not None and not self.matcher.may_contain(self.matcher.encode(text)):
+            return ''
         sentences = nltk.sent_tokenize(text)
+        if self.n_sample is not None and self.dict_phrases is not None:
+            sentences = [sentences[idx] for idx in self._candidates(sentences)]
+            if len(sentences) == 0:
+                return ''
         embeddings = self.model.encode(sentences, convert_to_tensor=True)
         cos_scores = util.cos_sim(embeddings, embeddings).numpy()
-        centrality_scores = degree_centrality_scores(cos_scores, threshold=None)
+        centrality_scores = degree_centrality_scores(
+            cos_scores,
+            threshold=None,
+            top_k=self.k,
+            patience=self.patience,
+            )
         most_central_sentence_indices = np.argsort(-centrality_scores)
         
         idx_list = [int(idx)
-                    for idx in most_central_sentence_indices[:5]
+                    for idx in most_central_sentence_indices[:self.k]
                     ]
         
         return ' '.join(
@@ -71,8 +142,7 @@ if __name__ == '__main__':
     #     New York City traces its origins to a trading post founded by colonists from the Dutch Republic in 1624 on Lower Manhattan; the post was named New Amsterdam in 1626. The city and its surroundings came under English control in 1664 and were renamed New York after King Charles II of England granted the lands to his brother, the Duke of York. The city was regained by the Dutch in July 1673 and was subsequently renamed New Orange for one year and three months; the city has been continuously named New York since November 1674. New York City was the capital of the United States from 1785 until 1790, and has been the largest U.S. city since 1790. The Statue of Liberty greeted millions of immigrants as they came to the U.S. by ship in the late 19th and early 20th centuries, and is a symbol of the U.S. and its ideals of liberty and peace. In the 21st century, New York has emerged as a global node of creativity, entrepreneurship, and environmental sustainability, and as a symbol of freedom and cultural diversity. In 2019, New York was voted the greatest city in the world per a survey of over 30,000 people from 48 cities worldwide, citing its cultural diversity.
     #     Many districts and landmarks in New York City are well known, including three of the world's ten most visited tourist attractions in 2013. A record 62.8 million tourists visited New York City in 2017. Times Square is the brightly illuminated hub of the Broadway Theater District, one of the world's busiest pedestrian intersections, and a major center of the world's entertainment industry. Many of the city's landmarks, skyscrapers, and parks are known around the world. Manhattan's real estate market is among the most expensive in the world. Providing continuous 24/7 service and contributing to the nickname The City that Never Sleeps, the New York City Subway is the largest single-operator rapid transit system worldwide, with 472 rail stations. The city has over 120 colleges and universities, including Columbia University, New York University, Rockefeller University, and the City University of New York system, which is the largest urban public university system in the United States. Anchored by Wall Street in the Financial District of Lower Manhattan, New York City has been called both the world's leading financial center and the most financially powerful city in the world, and is home to the world's two largest stock exchanges by total market capitalization, the New York Stock Exchange and NASDAQ.
     #     """
-    text = re.sub(r'\n+', '. ', text)
-    text = re.sub(r'\s{2,}', '', text)
+    text = clean_text(text)
     
     summariser = LexRankSummariser()
     test = summariser._summarise(text)
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+'''
+AUTHOR
+------
+    Goto Ryusuke (yuhang1012long@link.cuhk.edu.hk)
+    Find me at:
+        https://github.com/GotoRyusuke
+
+DESCRIPTION
+-----------
+A process pool that keeps the total memory of its workers under a limit.
+
+The summarisers are memory-hungry (LexRank needs abt 60 GB for one type of
+filings), so a fixed num of jobs is only a guess: too many and the OOM
+killer ends the whole run. The pool here does the following:
+    - tracks the memory of every worker and the size of the next filing;
+    - only starts a worker, and only dispatches a filing, when the projected
+    memory stays under the limit; a worker counts with the memory it was
+    measured to take right after loading its model;
+    - stops the idle workers while filings are held back, so that their
+    models do not hold the memory the busy workers need;
+    - sends very large filings to a low-parallelism lane;
+    - restarts workers that pass a memory ceiling and puts their
+    unfinished filing back to the queue.
+
+STRUCTURE
+---------
+-<func> _worker_main
+-<class> MemoryBoundedPool
+| -<method> _spawn
+| -<method> _kill
+| -<method> _retire
+| -<method> _rss
+| -<method> _projected
+| -<method> _peek
+| -<method> _next_task
+| -<method> _grow
+| -<method> _requeue
+| -<method> _supervise
+| -<method> map
+-<END>
+
+NOTE
+----
+Each worker builds its own summariser via `worker_init`, which must be a
+top-level (picklable) func returning a callable task -> value. Loading the
+model again is the price of a restart, so keep `worker_ceiling` generous.
+
+Workers are started with the 'spawn' method and measured by their USS
+(memory unique to the process), so pages shared with the parent are not
+counted once per worker.
+
+'''
+import time
+import logging
+import traceback
+import multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+
+import psutil
+
+logger = logging.getLogger(__name__)
+_mp = mp.get_context('spawn')
+
+def _worker_main(worker_init, init_args:tuple, conn):
+    '''
+    Loop of a worker process: build the task func, then run tasks sent
+    through the pipe until None is received.
+    '''
+    try:
+        func = worker_init(*init_args)
+    except Exception:
+        conn.send(('init_error', None, traceback.format_exc()))
+        conn.close()
+        return
+    conn.send(('ready', None, None))
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        try:
+            conn.send(('done', task, func(task)))
+        except Exception:
+            conn.send(('error', task, traceback.format_exc()))
+    conn.close()
+
+class MemoryBoundedPool:
+    def __init__(
+            self,
+            worker_init,
+            init_args:tuple,
+            jobs:int,
+            mem_limit:int = None,
+            worker_ceiling:int = None,
+            large_size:int = 1000000,
+            large_jobs:int = 1,
+            mem_per_byte:float = 100.,
+            max_retries:int = 2,
+            poll:float = 0.5,
+            ):
+        '''
+        Parametres
+        ----------
+        worker_init: callable
+            Top-level func called in every worker with init_args; should
+            return a func that maps a task to its value.
+        init_args: tuple
+            Args for worker_init.
+        jobs: int
+            Max num of workers.
+        mem_limit: int
+            Total bytes all workers may use together. Default to 90% of
+            the memory available when the pool is created.
+        worker_ceiling: int
+            Bytes a single worker may grow above its memory right after
+            worker_init (e.g. the loaded model) before it is restarted.
+            Default to mem_limit / jobs * 2.
+        large_size: int
+            Filings with at least this many bytes go to the large lane.
+        large_jobs: int
+            Max num of large filings processed at the same time.
+        mem_per_byte: float
+            Rough estimate of the extra memory a worker needs per byte
+            of filing.
+        max_retries: int
+            Num of times a filing is re-queued after its worker was
+            restarted or died before it is given up; also the num of
+            workers in a row that may die before being ready.
+        poll: float
+            Seconds between two memory checks.
+        '''
+        if mem_limit is None:
+            mem_limit = int(psutil.virtual_memory().available * 0.9)
+        if worker_ceiling is None:
+            worker_ceiling = int(mem_limit / jobs * 2)
+
+        self.worker_init = worker_init
+        self.init_args = init_args
+        self.jobs = jobs
+        self.mem_limit = mem_limit
+        self.worker_ceiling = worker_ceiling
+        self.large_size = large_size
+        self.large_jobs = large_jobs
+        self.mem_per_byte = mem_per_byte
+        self.max_retries = max_retries
+        self.poll = poll
+        # wid -> dict(proc, conn, ready, task, init_rss, base_rss)
+        self.workers = {}
+        self._next_wid = 0
+        # workers in a row that died before being ready
+        self._init_failures = 0
+        # memory of a worker right after worker_init, once measured
+        self._init_rss = None
+
+    def _spawn(self):
+        conn, child_conn = _mp.Pipe()
+        proc = _mp.Process(
+            target=_worker_main,
+            args=(self.worker_init, self.init_args, child_conn),
+            daemon=True,
+            )
+        proc.start()
+        child_conn.close()
+        self.workers[self._next_wid] = {
+            'proc': proc,
+            'conn': conn,
+            'ready': False,
+            'task': None,
+            'init_rss': 0,
+            'base_rss': 0,
+            }
+        self._next_wid += 1
+
+    def _kill(self, wid:int, reason:str):
+        '''
+        Kill a worker and return its unfinished task. A new worker is
+        started by _grow once memory allows.
+        '''
+        worker = self.workers.pop(wid)
+        if not worker['ready']:
+            # never got ready: restarting blindly could loop forever
+            self._init_failures += 1
+            if self._init_failures > self.max_retries:
+                raise RuntimeError(
+                    '{} workers in a row died before being ready; last one: {}'.format(
+                        self._init_failures, reason,
+                        )
+                    )
+        logger.warning(
+            'Restarting worker %d (pid %s): %s',
+            wid, worker['proc'].pid, reason,
+            )
+        if worker['proc'].is_alive():
+            worker['proc'].terminate()
+        worker['proc'].join()
+        worker['conn'].close()
+        return worker['task']
+
+    def _retire(self, wid:int):
+        '''
+        Stop an idle worker to release the memory of its model.
+        '''
+        worker = self.workers.pop(wid)
+        try:
+            worker['conn'].send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        worker['proc'].join(timeout=self.poll)
+        if worker['proc'].is_alive():
+            worker['proc'].terminate()
+            worker['proc'].join()
+        worker['conn'].close()
+
+    def _rss(self, wid:int)->int:
+        '''
+        Memory unique to a worker (USS); RSS if USS is not available.
+        '''
+        try:
+            proc = psutil.Process(self.workers[wid]['proc'].pid)
+            try:
+                return proc.memory_full_info().uss
+            except psutil.AccessDenied:
+                return proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied, ValueError):
+            return 0
+
+    def _projected(self, rss:dict, size:int)->float:
+        '''
+        Memory expected to be used if a filing of the given size is
+        dispatched now: current memory of all workers (at least the
+        measured memory after worker_init for those still starting),
+        plus what the busy workers are expected to grow, plus the new filing.
+        '''
+        total = 0
+        for wid, worker in self.workers.items():
+            if worker['ready']:
+                total += rss[wid]
+            else:
+                total += max(rss[wid], self._init_rss or 0)
+            if worker['task'] is not None:
+                grown = rss[wid] - worker['base_rss']
+                expected = self.mem_per_byte * self.sizes[worker['task']]
+                total += max(0, expected - grown)
+        return total + self.mem_per_byte * size
+
+    def _peek(self):
+        '''
+        Get the lanes whose first task may be dispatched now, in the
+        order they are tried.
+        '''
+        busy = [w['task'] for w in self.workers.values() if w['task'] is not None]
+        n_large = sum(1 for task in busy if task in self.large_tasks)
+        return [
+            lane
+            for lane, allowed in ((self.large, n_large < self.large_jobs), (self.normal, True))
+            if lane and allowed
+            ]
+
+    def _next_task(self, rss:dict):
+        '''
+        Pick the next task that fits in memory, or None.
+        '''
+        busy = any(w['task'] is not None for w in self.workers.values())
+        for lane in self._peek():
+            # always let a task run alone, otherwise nothing would progress
+            if not busy or self._projected(rss, self.sizes[lane[0]]) <= self.mem_limit:
+                return lane.popleft()
+        return None
+
+    def _grow(self, rss:dict):
+        '''
+        Start workers while there are tasks for them and the projected
+        memory, with a new worker taking its measured memory after
+        worker_init, stays under the limit.
+        '''
+        while len(self.workers) < self.jobs:
+            lanes = self._peek()
+            # the starting workers will take the first tasks
+            waiting = sum(1 for w in self.workers.values() if w['task'] is None)
+            if waiting >= sum(len(lane) for lane in lanes):
+                return
+            if self.workers:
+                # the memory of a worker is unknown until one gets ready
+                if self._init_rss is None:
+                    return
+                size = self.mem_per_byte * self.sizes[lanes[0][0]]
+                projected = self._projected(rss, 0) + (waiting + 1) * size + self._init_rss
+                if projected > self.mem_limit:
+                    return
+            self._spawn()
+            rss[self._next_wid - 1] = 0
+
+    def _requeue(self, task):
+        if task is None:
+            return
+        self.retries[task] = self.retries.get(task, 0) + 1
+        if self.retries[task] > self.max_retries:
+            logger.warning('Giving up task %s after %d retries', task, self.max_retries)
+            self.results[task] = None
+            if self.callback is not None:
+                self.callback(task, None)
+            return
+        # a task that once blew up a worker goes to the large lane
+        self.large_tasks.add(task)
+        self.large.appendleft(task)
+
+    def _supervise(self):
+        '''
+        Check the health and memory of every worker; restart the dead
+        and the bloated ones. A worker is bloated when it has grown more
+        than worker_ceiling above its memory right after worker_init, so
+        that a model larger than the ceiling does not cause endless restarts.
+        '''
+        for wid in list(self.workers):
+            worker = self.workers[wid]
+            if not worker['proc'].is_alive():
+                self._requeue(self._kill(wid, 'died with exit code %s' % worker['proc'].exitcode))
+            elif worker['ready'] and self._rss(wid) - worker['init_rss'] > self.worker_ceiling:
+                self._requeue(self._kill(wid, 'passed the memory ceiling'))
+
+    def map(self, tasks:list, sizes:list, callback = None)->dict:
+        '''
+        Run all tasks in the pool.
+
+        Parametres
+        ----------
+        tasks: list
+            Hashable tasks, e.g. indices of forms in a summary df.
+        sizes: list
+            Size in bytes of every task, in the same order.
+        callback: callable
+            If given, called with (task, value) in the main process as
+            soon as a task finishes, fails or is given up.
+
+        Return
+        ------
+        results: dict
+            task -> value; None for tasks failed or given up.
+        '''
+        self.sizes = dict(zip(tasks, sizes))
+        self.large_tasks = {
+            task for task in tasks
+            if self.sizes[task] >= self.large_size
+            }
+        self.large = deque(task for task in tasks if task in self.large_tasks)
+        self.normal = deque(task for task in tasks if task not in self.large_tasks)
+        self.results = {}
+        self.retries = {}
+        self.callback = callback
+
+        last_check = 0
+        try:
+            while len(self.results) < len(tasks):
+                conns = {w['conn']: wid for wid, w in self.workers.items()}
+                for conn in wait(list(conns), timeout=self.poll):
+                    wid = conns[conn]
+                    try:
+                        status, task, value = conn.recv()
+                    except (EOFError, OSError):
+                        # handled by _supervise
+                        continue
+                    worker = self.workers[wid]
+                    if status == 'init_error':
+                        raise RuntimeError(
+                            'worker_init failed in worker {}:\n{}'.format(wid, value)
+                            )
+                    if status == 'ready':
+                        worker['init_rss'] = self._rss(wid)
+                        self._init_rss = max(self._init_rss or 0, worker['init_rss'])
+                        self._init_failures = 0
+                    if status == 'error':
+                        # record it like a task given up and keep going
+                        logger.error('Task %s failed in worker %d:\n%s', task, wid, value)
+                        self.results[task] = None
+                        if callback is not None:
+                            callback(task, None)
+                    if status == 'done':
+                        self.results[task] = value
+                        if callback is not None:
+                            callback(task, value)
+                    worker['ready'] = True
+                    worker['task'] = None
+                    worker['base_rss'] = self._rss(wid)
+
+                if time.time() - last_check >= self.poll:
+                    self._supervise()
+                    last_check = time.time()
+
+                # dispatch to idle workers while memory allows
+                rss = {wid: self._rss(wid) for wid in self.workers}
+                for wid, worker in self.workers.items():
+                    if not worker['ready'] or worker['task'] is not None:
+                        continue
+                    task = self._next_task(rss)
+                    if task is None:
+                        break
+                    worker['conn'].send(task)
+                    worker['task'] = task
+
+                # idle workers left now have nothing to do or are held back
+                # by memory: let them release their models
+                for wid in [
+                        wid for wid, worker in self.workers.items()
+                        if worker['ready'] and worker['task'] is None
+                        ]:
+                    self._retire(wid)
+                self._grow(rss)
+        finally:
+            for worker in self.workers.values():
+                try:
+                    worker['conn'].send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            for worker in self.workers.values():
+                worker['proc'].join(timeout=self.poll)
+                if worker['proc'].is_alive():
+                    worker['proc'].terminate()
+                worker['conn'].close()
+            self.workers = {}
+
+        return self.results
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+'''
+AUTHOR
+------
+    Goto Ryusuke (yuhang1012long@link.cuhk.edu.hk)
+    Find me at:
+        https://github.com/GotoRyusuke
+
+DESCRIPTION
+-----------
+Command-line entry point of the AttentionToSummary class:
+    - choose the summariser (or a cascade of them) and its options;
+    - run the forms one by one, with memory-bounded workers, or as a
+    worker of a sharded run;
+    - stream the value of every form to a jsonl file as soon as it is done,
+    and show the throughput and ETA;
+    - save the final table as xlsx, csv or jsonl.
+
+Examples:
+    python runAttention.py summary.xlsx --store-path F:/EDGAR/2022Q2_extracted/ \\
+        --form-type 10-Q --summariser lexrank --jobs 16 --output attn.xlsx
+    python runAttention.py summary.xlsx --store-path /data/extracted/ --form-type 8-K \\
+        --cascade spacy lexrank --shards 64 --work-dir /shared/attn_8K
+    python runAttention.py summary.xlsx --store-path /data/extracted/ --form-type 8-K \\
+        --cascade spacy lexrank --shards 64 --work-dir /shared/attn_8K --merge --output attn.csv
+
+STRUCTURE
+---------
+-<class> Progress
+| -<method> update
+| -<method> report
+| -<method> close
+-<func> parse_args
+-<func> summariser_kwargs
+-<func> write_table
+-<func> main
+-<END>
+
+'''
+import os
+import sys
+import json
+import time
+import argparse
+
+class Progress:
+    def __init__(
+            self,
+            total:int = None,
+            stream_path:str = None,
+            df = None,
+            interval:float = 1.,
+            append:bool = False,
+            ):
+        '''
+        Parametres
+        ----------
+        total: int
+            Num of forms to process; the ETA is not shown if None.
+        stream_path: str
+            If given, every form done is written to this jsonl file.
+        df: pandas df
+            The summary df, to add the basic info of a form to the stream.
+        interval: float
+            Min seconds between two reports.
+        append: bool
+            Append to the stream file instead of overwriting it.
+        '''
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.n_sents = 0
+        self.start = time.time()
+        self.last_report = 0
+        self.stream = open(
+            stream_path, 'a' if append else 'w', encoding='utf-8',
+            ) if stream_path else None
+        self.df = df
+
+    def update(self, idx, value, tier, n_sents):
+        '''
+        Callback of AttentionToSummary: record a form done.
+        '''
+        self.done += 1
+        self.n_sents += n_sents or 0
+        if self.stream is not None:
+            record = {'idx': int(idx), 'rus_attn': value, 'attn_tier': tier}
+            if self.df is not None:
+                record.update({
+                    col: str(self.df.loc[idx, col])
+                    for col in ['CIK', 'co_name', 'f_date']
+                    })
+            self.stream.write(json.dumps(record) + '\n')
+            self.stream.flush()
+        if time.time() - self.last_report >= self.interval:
+            self.report()
+
+    def report(self, end:str = '\r'):
+        now = time.time()
+        self.last_report = now
+        elapsed = max(now - self.start, 1e-9)
+        rate = self.done / elapsed
+        line = '{} forms | {:.2f} forms/s | {:.1f} sentences/s'.format(
+            self.done if self.total is None else '{}/{}'.format(self.done, self.total),
+            rate,
+            self.n_sents / elapsed,
+            )
+        if self.total is not None and rate > 0:
+            eta = (self.total - self.done) / rate
+            line += ' | ETA {:d}:{:02d}:{:02d}'.format(
+                int(eta // 3600), int(eta % 3600 // 60), int(eta % 60),
+                )
+        sys.stderr.write(line + ' ' * 8 + end)
+        sys.stderr.flush()
+
+    def close(self):
+        self.report(end='\n')
+        if self.stream is not None:
+            self.stream.close()
+
+def parse_args(argv:list = None):
+    parser = argparse.ArgumentParser(
+        description='Detect whether filings focus on the Russian-Ukraine war.',
+        )
+    parser.add_argument('summary_path', help='summary table of the filings (xlsx or csv)')
+    parser.add_argument('--store-path', required=True, help='folder of the extracted files')
+    parser.add_argument(
+        '--form-type', required=True,
+        choices=['8-K', '10-Q', '10-K_Item1A', '10-K_Item7'],
+        )
+    parser.add_argument(
+        '--dicts', nargs='+', default=['rus_dict_lemma.txt', 'rus_names.txt'],
+        help='dict files',
+        )
+
+    group = parser.add_argument_group('summariser')
+    group.add_argument('--summariser', default='spacy', choices=['spacy', 'lexrank', 'finance'])
+    group.add_argument(
+        '--cascade', nargs='+', choices=['spacy', 'lexrank', 'finance'],
+        help='summarisers of the cascade mode, from the cheapest to the most expensive',
+        )
+    group.add_argument(
+        '--density-range', nargs=2, type=float, default=[0.1, 2.], metavar=('LOW', 'HIGH'),
+        help='dict words/phrases per 1000 words settling the forms in cascade mode',
+        )
+    group.add_argument('--k', type=int, help='num of sentences in a summary')
+    group.add_argument('--patience', type=int, help='early exit of the LexRank power iteration')
+    group.add_argument(
+        '--n-sample', type=int,
+        help='only rank the LexRank sentences with dict hits plus this many others; '
+        'approximate and biased toward 1',
+        )
+    group.add_argument(
+        '--model-cache',
+        help='cache folder of the Hugging Face / SBERT models, also searched for '
+        'the NLTK data used by LexRank (tokenizers/punkt)',
+        )
+
+    group = parser.add_argument_group('execution')
+    group.add_argument(
+        '--jobs', type=int, default=1,
+        help='max num of memory-bounded workers; 1 to process the forms one by one',
+        )
+    group.add_argument('--mem-limit', type=float, help='GB all workers may use together')
+    group.add_argument('--worker-ceiling', type=float, help='GB a worker may use before restarting')
+    group.add_argument('--large-size', type=int, help='bytes from which a filing is large')
+    group.add_argument('--large-jobs', type=int, help='max num of large filings at the same time')
+    group.add_argument(
+        '--range', nargs=2, type=int, metavar=('START', 'STOP'),
+        help='only process the forms with START <= index < STOP',
+        )
+    group.add_argument('--shards', type=int, help='run as a worker of a sharded run')
+    group.add_argument('--work-dir', help='shared folder of the sharded run')
+    group.add_argument('--merge', action='store_true', help='merge the outputs of a sharded run')
+
+    group = parser.add_argument_group('output')
+    group.add_argument('--output', help='final table (xlsx, csv or jsonl)')
+    group.add_argument(
+        '--format', choices=['xlsx', 'csv', 'jsonl'],
+        help='format of the final table; default to the extension of --output',
+        )
+    group.add_argument('--stream', help='jsonl file to write every form to as soon as it is done')
+    group.add_argument(
+        '--append', action='store_true',
+        help='append to --stream instead of overwriting it; '
+        'a form run twice then has several lines, keep the last one of each idx',
+        )
+
+    args = parser.parse_args(argv)
+    if args.density_range[0] > args.density_range[1]:
+        parser.error('--density-range needs LOW <= HIGH')
+    if args.shards is not None and args.work_dir is None:
+        parser.error('--shards needs --work-dir')
+    if args.append and args.stream is None:
+        parser.error('--append needs --stream')
+    if args.merge and args.shards is None:
+        parser.error('--merge needs --shards')
+    if args.shards is not None and args.range is not None:
+        parser.error('--range cannot be used with --shards')
+    shard_worker = args.shards is not None and not args.merge
+    if shard_worker and args.output is not None:
+        parser.error('a shard worker saves its shards in --work-dir; use --merge for --output')
+    if not shard_worker and args.output is None:
+        parser.error('--output is needed unless running as a shard worker')
+    return args
+
+def summariser_kwargs(args)->dict:
+    '''
+    Kwargs of every summariser from the command-line options.
+    '''
+    kwargs = {'spacy': {}, 'lexrank': {}}
+    if args.k is not None:
+        kwargs['spacy']['k'] = args.k
+        kwargs['lexrank']['k'] = args.k
+    if args.patience is not None:
+        kwargs['lexrank']['patience'] = args.patience
+    if args.n_sample is not None:
+        kwargs['lexrank']['n_sample'] = args.n_sample
+    return kwargs
+
+def write_table(output, path:str, fmt:str = None):
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'xlsx':
+        output.to_excel(path, index=False)
+    elif fmt == 'csv':
+        output.to_csv(path, index=False)
+    elif fmt == 'jsonl':
+        output.to_json(path, orient='records', lines=True)
+    else:
+        raise ValueError('Unknown output format {}; should be xlsx, csv or jsonl'.format(fmt))
+
+def main(argv:list = None):
+    args = parse_args(argv)
+    if args.model_cache is not None:
+        # must be set before the summarisers are imported
+        os.environ['HF_HOME'] = args.model_cache
+        os.environ['SENTENCE_TRANSFORMERS_HOME'] = args.model_cache
+        # searched before the default folders of NLTK
+        os.environ['NLTK_DATA'] = args.model_cache
+    from attnToSummary import AttentionToSummary
+    from shardRun import ShardRunner
+
+    attn = AttentionToSummary(
+        args.summary_path,
+        args.dicts,
+        args.store_path,
+        args.form_type,
+        summariser=args.summariser,
+        cascade=args.cascade,
+        density_range=tuple(args.density_range),
+        summariser_kwargs=summariser_kwargs(args),
+        )
+    pool_kwargs = {
+        key: value
+        for key, value in [
+            ('mem_limit', args.mem_limit and int(args.mem_limit * 2**30)),
+            ('worker_ceiling', args.worker_ceiling and int(args.worker_ceiling * 2**30)),
+            ('large_size', args.large_size),
+            ('large_jobs', args.large_jobs),
+            ]
+        if value is not None
+        }
+    jobs = args.jobs if args.jobs > 1 else None
+
+    if args.shards is not None:
+        runner = ShardRunner(attn, args.work_dir, args.shards)
+        if args.merge:
+            output = runner.merge()
+        else:
+            # the ETA assumes this worker alone processes every form left
+            runner.prepare()
+            progress = Progress(
+                total=runner.forms_left(),
+                stream_path=args.stream,
+                df=attn.df,
+                append=args.append,
+                )
+            done = runner.work(jobs=jobs, callback=progress.update, **pool_kwargs)
+            progress.close()
+            sys.stderr.write('Shards done by this worker: {}\n'.format(done))
+            return
+    else:
+        if args.range is not None:
+            _range = [idx for idx in attn.df.index if args.range[0] <= idx < args.range[1]]
+        else:
+            _range = list(attn.df.index)
+        progress = Progress(
+            total=len(_range),
+            stream_path=args.stream,
+            df=attn.df,
+            append=args.append,
+            )
+        if jobs is None:
+            output = attn.assign_in_batch(_range, callback=progress.update)
+        else:
+            output = attn.supervised_batch(_range, jobs, callback=progress.update, **pool_kwargs)
+        progress.close()
+        output = attn._finalise(output)
+
+    if args.cascade is not None:
+        sys.stderr.write(attn.tier_report(output).to_string() + '\n')
+    write_table(output, args.output, args.format)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+'''
+AUTHOR
+------
+    Goto Ryusuke (yuhang1012long@link.cuhk.edu.hk)
+    Find me at:
+        https://github.com/GotoRyusuke
+
+DESCRIPTION
+-----------
+Module to run the AttentionToSummary class on several machines:
+    - split the summary table into deterministic shards by CIK hash;
+    - let independent workers, possibly on different hosts sharing
+    a folder, claim shards through an SQLite-backed queue;
+    - save the output of every shard and merge them into the final table.
+
+A claim is a lease: the worker renews it while processing the shard, and a
+shard whose lease has expired (e.g. its worker died) can be claimed again.
+A shard claimed max_attempts times without being done (e.g. it always
+raises) is marked as failed instead of being claimed forever.
+Outputs are written to a temp file and then renamed, so a dead worker never
+leaves a partial output, and a shard done twice just gives the same file.
+
+STRUCTURE
+---------
+-<func> cik_shard
+-<class> ShardQueue
+| -<method> _connect
+| -<method> _fail_exhausted
+| -<method> init
+| -<method> claim
+| -<method> renew
+| -<method> release
+| -<method> complete
+| -<method> status
+| -<method> shards
+-<class> ShardRunner
+| -<method> shard_index
+| -<method> shard_path
+| -<method> prepare
+| -<method> forms_left
+| -<method> run_shard
+| -<method> work
+| -<method> merge
+-<END>
+
+NOTE
+----
+SQLite relies on the file locks of the file system. Most local and SMB
+shares are fine, but the locks of some NFS setups are not reliable; put
+the queue on a share with working locks.
+
+'''
+import os
+import time
+import zlib
+import socket
+import logging
+import sqlite3
+import threading
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+def cik_shard(cik, n_shards:int)->int:
+    '''
+    Get the shard of a CIK. Uses crc32 instead of hash(), which is
+    salted differently in every process.
+    '''
+    return zlib.crc32(str(cik).encode('utf-8')) % n_shards
+
+class ShardQueue:
+    def __init__(self, db_path:str, lease:float = 600., max_attempts:int = 3):
+        '''
+        Parametres
+        ----------
+        db_path: str
+            The path to the SQLite file of the queue.
+        lease: float
+            Seconds a claim stays valid without being renewed.
+        max_attempts: int
+            Num of claims of a shard before it is marked as failed.
+        '''
+        self.db_path = db_path
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+    def _connect(self):
+        # autocommit mode; transactions are opened explicitly
+        return sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+
+    def _fail_exhausted(self, conn, now:float):
+        '''
+        Mark as failed the shards whose last claim has expired and which
+        have no attempts left.
+        '''
+        conn.execute(
+            "UPDATE shards SET status = 'failed' "
+            "WHERE status = 'running' AND expires < ? AND attempts >= ?",
+            (now, self.max_attempts),
+            )
+
+    def init(self, n_shards:int):
+        '''
+        Create the queue with all shards pending. Can be called by every
+        worker: an existing queue is kept as it is.
+        '''
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)'
+                )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS shards ('
+                'shard INTEGER PRIMARY KEY, status TEXT, owner TEXT, '
+                'expires REAL, attempts INTEGER)'
+                )
+            row = conn.execute("SELECT value FROM meta WHERE key = 'n_shards'").fetchone()
+            if row is None:
+                conn.execute("INSERT INTO meta VALUES ('n_shards', ?)", (str(n_shards),))
+                conn.executemany(
+                    "INSERT INTO shards VALUES (?, 'pending', NULL, 0, 0)",
+                    [(shard,) for shard in range(n_shards)],
+                    )
+            elif int(row[0]) != n_shards:
+                raise ValueError(
+                    'The queue at {} has {} shards, not {}'.format(self.db_path, row[0], n_shards)
+                    )
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, owner:str):
+        '''
+        Claim a pending shard, or a running shard whose lease has expired.
+
+        Return
+        ------
+        The num of the shard claimed, or None if nothing is left to claim.
+        '''
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._fail_exhausted(conn, now)
+            row = conn.execute(
+                "SELECT shard FROM shards WHERE status = 'pending' "
+                "OR (status = 'running' AND expires < ?) "
+                "ORDER BY attempts, shard LIMIT 1",
+                (now,),
+                ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE shards SET status = 'running', owner = ?, expires = ?, "
+                    "attempts = attempts + 1 WHERE shard = ?",
+                    (owner, now + self.lease, row[0]),
+                    )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        return None if row is None else row[0]
+
+    def renew(self, shard:int, owner:str)->bool:
+        '''
+        Extend the lease of a shard. Return False if the shard has been
+        claimed by someone else in the meantime.
+        '''
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "UPDATE shards SET expires = ? "
+                "WHERE shard = ? AND owner = ? AND status = 'running'",
+                (time.time() + self.lease, shard, owner),
+                )
+            return cur.rowcount == 1
+        finally:
+            conn.close()
+
+    def release(self, shard:int, owner:str):
+        '''
+        Give back a shard that could not be processed: pending again if
+        attempts are left, else failed.
+        '''
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE shards SET "
+                "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL "
+                "WHERE shard = ? AND owner = ? AND status = 'running'",
+                (self.max_attempts, shard, owner),
+                )
+        finally:
+            conn.close()
+
+    def complete(self, shard:int, owner:str)->bool:
+        '''
+        Mark a shard as done. Also accepted if the lease has expired but
+        nobody else has claimed the shard yet.
+        '''
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "UPDATE shards SET status = 'done' "
+                "WHERE shard = ? AND owner = ? AND status = 'running'",
+                (shard, owner),
+                )
+            return cur.rowcount == 1
+        finally:
+            conn.close()
+
+    def status(self)->dict:
+        '''
+        Get the num of shards in each status: pending, running,
+        done or failed.
+        '''
+        conn = self._connect()
+        try:
+            self._fail_exhausted(conn, time.time())
+            rows = conn.execute(
+                'SELECT status, COUNT(*) FROM shards GROUP BY status'
+                ).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    def shards(self, status:str)->list:
+        '''
+        Get the shards in a status.
+        '''
+        conn = self._connect()
+        try:
+            self._fail_exhausted(conn, time.time())
+            rows = conn.execute(
+                'SELECT shard FROM shards WHERE status = ? ORDER BY shard',
+                (status,),
+                ).fetchall()
+        finally:
+            conn.close()
+        return [row[0] for row in rows]
+
+class ShardRunner:
+    def __init__(
+            self,
+            attn,
+            work_dir:str,
+            n_shards:int,
+            lease:float = 600.,
+            max_attempts:int = 3,
+            ):
+        '''
+        Parametres
+        ----------
+        attn: AttentionToSummary
+            The object to process the forms. Every worker builds its own
+            one with the same summary table.
+        work_dir: str
+            The folder shared by all workers, where the queue and the
+            outputs of the shards are saved.
+        n_shards: int
+            Num of shards.
+        lease: float
+            Seconds a claim stays valid without being renewed. Should be
+            much longer than a single form takes.
+        max_attempts: int
+            Num of claims of a shard before it is marked as failed.
+        '''
+        os.makedirs(work_dir, exist_ok=True)
+        self.attn = attn
+        self.work_dir = work_dir
+        self.n_shards = n_shards
+        self.queue = ShardQueue(
+            os.path.join(work_dir, 'shards.sqlite'),
+            lease,
+            max_attempts,
+            )
+        # shard -> indices of forms in the summary df
+        shards = [cik_shard(cik, n_shards) for cik in attn.df['CIK']]
+        self.index = {shard: [] for shard in range(n_shards)}
+        for idx, shard in zip(attn.df.index, shards):
+            self.index[shard].append(idx)
+
+    def shard_index(self, shard:int)->list:
+        return self.index[shard]
+
+    def shard_path(self, shard:int)->str:
+        return os.path.join(self.work_dir, 'shard_{}.pkl'.format(shard))
+
+    def prepare(self):
+        '''
+        Create the queue if it does not exist yet.
+        '''
+        self.queue.init(self.n_shards)
+
+    def forms_left(self)->int:
+        '''
+        Num of forms in the shards not done or failed yet, including
+        those being processed by other workers.
+        '''
+        return sum(
+            len(self.shard_index(shard))
+            for status in ['pending', 'running']
+            for shard in self.queue.shards(status)
+            )
+
+    def run_shard(self, shard:int, jobs:int = None, callback = None, **pool_kwargs):
+        '''
+        Process a single shard and save its output.
+
+        Parametres
+        ----------
+        shard: int
+            The num of the shard.
+        jobs: int
+            If given, process the forms with AttentionToSummary.supervised_batch
+            using this num of workers; otherwise one by one.
+        callback: callable
+            Called with (idx, value, tier, n_sentences) as soon as a
+            form is done.
+        pool_kwargs:
+            Passed to MemoryBoundedPool.
+        '''
+        _range = self.shard_index(shard)
+        if jobs is None:
+            df = self.attn.assign_in_batch(_range, callback)
+        else:
+            df = self.attn.supervised_batch(_range, jobs, callback, **pool_kwargs)
+        # the workers leave failed forms empty instead of raising: fail the
+        # shard as well, so that it is retried like with jobs=None
+        if 'rus_attn' in df.columns and df['rus_attn'].isna().any():
+            missing = list(df.index[df['rus_attn'].isna()])
+            raise RuntimeError(
+                'Shard {}: {} forms failed or were given up: {}'.format(
+                    shard, len(missing), missing,
+                    )
+                )
+        # write then rename, so that the output is either complete or absent
+        path = self.shard_path(shard)
+        tmp_path = '{}.{}.{}.tmp'.format(path, socket.gethostname(), os.getpid())
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+    def work(self, owner:str = None, jobs:int = None, callback = None, **pool_kwargs)->list:
+        '''
+        Claim and process shards until none is left.
+
+        Parametres
+        ----------
+        owner: str
+            Name of this worker. Default to hostname:pid.
+        jobs, callback, pool_kwargs:
+            Passed to run_shard.
+
+        Return
+        ------
+        done: list
+            The shards completed by this worker.
+        '''
+        if owner is None:
+            owner = '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.prepare()
+        done = []
+        while True:
+            shard = self.queue.claim(owner)
+            if shard is None:
+                break
+            # renew the lease in the background while the shard is processed
+            stop = threading.Event()
+            def keep_alive():
+                while not stop.wait(self.queue.lease / 3):
+                    if not self.queue.renew(shard, owner):
+                        break
+            renewer = threading.Thread(target=keep_alive, daemon=True)
+            renewer.start()
+            try:
+                self.run_shard(shard, jobs, callback, **pool_kwargs)
+            except Exception:
+                logger.exception('Shard %d failed in %s', shard, owner)
+                self.queue.release(shard, owner)
+                continue
+            finally:
+                stop.set()
+                renewer.join()
+            if self.queue.complete(shard, owner):
+                done.append(shard)
+        return done
+
+    def merge(self):
+        '''
+        Merge the outputs of all shards into the final table.
+
+        Return
+        ------
+        output: pandas df
+            Complete summary df with the column "rus_attn"
+        '''
+        status = self.queue.status()
+        if status.get('failed', 0) > 0:
+            raise RuntimeError(
+                'Shards {} failed after {} attempts'.format(
+                    self.queue.shards('failed'), self.queue.max_attempts,
+                    )
+                )
+        if status.get('done', 0) != self.n_shards:
+            raise RuntimeError(
+                'Not all shards are done: {}'.format(status)
+                )
+        output = pd.concat([
+            pd.read_pickle(self.shard_path(shard))
+            for shard in range(self.n_shards)
+            ])
+        return self.attn._finalise(output)
@@ -23,14 +23,21 @@ STRUCTURE
 -<END>
 
 '''
-import re
 import spacy 
 import string
 from heapq import nlargest
 from spacy.lang.en.stop_words import STOP_WORDS
+from textNorm import clean_text
 
 class SpacySummariser:
-    def __init__(self):
+    def __init__(self, k:int = 2):
+        '''
+        Parametre
+        ---------
+        k: int
+            Num of sentences in the summary.
+        '''
+        self.k = k
         self.nlp = spacy.load("en_core_web_sm")
         self.punctuation = string.punctuation +  '\n'
     
@@ -57,14 +64,14 @@ class SpacySummariser:
                         sent_score[sent] = word_freq[word.text.lower()]
                     else:
                         sent_score[sent] += word_freq[word.text.lower()]
-        summary = nlargest(n = 2 , iterable = sent_score , key = sent_score.get)
+        summary = nlargest(n = self.k , iterable = sent_score , key = sent_score.get)
         return ' '.join([str(sent) for sent in summary])
 
 if __name__ == '__main__':
     test_file_path = './test_file.txt'
     with open(test_file_path, 'r', encoding = 'utf-8') as f:
         text = f.read()
-    text = re.sub(r'\n+', '. ', text)
+    text = clean_text(text)
     
     obj = SpacySummariser()
     test = obj._summarise(text)
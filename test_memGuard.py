@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the memory-bounded pool, with a toy worker_init in place of
+the summarisers.
+'''
+import os
+import time
+import pytest
+from memGuard import MemoryBoundedPool
+
+MB = 2**20
+
+def _toy_init(flag_dir:str, model_mb:int = 0):
+    '''
+    Build a toy task func. The "model" is model_mb of memory held by
+    the worker. Tasks:
+        - 'raise': raises;
+        - 'die' and 'bloat': kill the worker and grow past any ceiling,
+        only the first time they run;
+        - anything else: returns (task, pid).
+    '''
+    model = b'\x01' * (model_mb * MB)
+    def func(task):
+        flag = os.path.join(flag_dir, str(task))
+        if task == 'raise':
+            raise ValueError('bad filing')
+        if task in ('die', 'bloat') and not os.path.exists(flag):
+            open(flag, 'w').close()
+            if task == 'die':
+                os._exit(1)
+            blob = b'\x01' * (200 * MB)
+            time.sleep(30)
+        return task, os.getpid(), len(model)
+    return func
+
+def _pool(tmp_path, jobs:int = 2, model_mb:int = 0, **kwargs):
+    kwargs.setdefault('mem_limit', 4096 * MB)
+    return MemoryBoundedPool(
+        _toy_init,
+        (str(tmp_path), model_mb),
+        jobs,
+        poll=0.05,
+        **kwargs,
+        )
+
+def test_task_error_keeps_other_results(tmp_path):
+    done = []
+    results = _pool(tmp_path).map(
+        ['a', 'raise', 'b'], [0, 0, 0],
+        callback=lambda task, value: done.append(task),
+        )
+    assert results['raise'] is None
+    assert results['a'][0] == 'a' and results['b'][0] == 'b'
+    assert sorted(done) == ['a', 'b', 'raise']
+
+def test_dead_worker_task_is_retried(tmp_path):
+    results = _pool(tmp_path).map(['a', 'die', 'b'], [0, 0, 0])
+    assert results['die'][0] == 'die'
+    assert results['a'][0] == 'a' and results['b'][0] == 'b'
+
+def test_worker_over_ceiling_is_restarted(tmp_path):
+    pool = _pool(tmp_path, worker_ceiling=50 * MB)
+    start = time.time()
+    results = pool.map(['a', 'bloat', 'b'], [0, 0, 0])
+    assert results['bloat'][0] == 'bloat'
+    assert results['a'][0] == 'a' and results['b'][0] == 'b'
+    # killed at the ceiling, not after the 30s sleep
+    assert time.time() - start < 20
+
+def test_workers_start_only_when_memory_allows(tmp_path):
+    tasks = ['t{}'.format(i) for i in range(6)]
+    # room for a single 100MB model only
+    pool = _pool(tmp_path, jobs=4, model_mb=100, mem_limit=150 * MB, worker_ceiling=500 * MB)
+    results = pool.map(tasks, [0] * len(tasks))
+    assert len({pid for _, pid, _ in results.values()}) == 1
+    assert pool._next_wid == 1
+    # with enough room, the other workers start once the first one is measured
+    pool = _pool(tmp_path, jobs=4, model_mb=100, worker_ceiling=500 * MB)
+    results = pool.map(tasks, [0] * len(tasks))
+    assert all(value is not None for value in results.values())
+    assert pool._next_wid == 4
+
+def test_init_failures_abort_after_max_retries(tmp_path):
+    pool = MemoryBoundedPool(_toy_init, (str(tmp_path), None), 2, mem_limit=4096 * MB, poll=0.05)
+    with pytest.raises(RuntimeError, match='worker_init failed'):
+        pool.map(['a'], [0])
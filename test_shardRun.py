@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the sharded runner, with local processes standing in for the
+workers on different hosts and a small stand-in for AttentionToSummary.
+'''
+import os
+import time
+import sqlite3
+import multiprocessing as mp
+import pandas as pd
+import pytest
+from shardRun import ShardRunner
+
+N_SHARDS = 6
+LEASE = 1.
+
+class LocalAttention:
+    '''
+    Stand-in for AttentionToSummary: the dummy is CIK % 2, and the forms
+    of the CIKs in fail_ciks always fail, raising one by one and left
+    empty with workers.
+    '''
+    def __init__(self, fail_ciks:tuple = ()):
+        self.df = pd.DataFrame({
+            'CIK': [1000 + i % 13 for i in range(100)],
+            'f_date': list(range(100)),
+            })
+        self.fail_ciks = fail_ciks
+
+    def assign_in_batch(self, _range, callback = None):
+        df = self.df.loc[_range, :].copy()
+        if any(cik in self.fail_ciks for cik in df['CIK']):
+            raise OSError('unreadable filing')
+        df['rus_attn'] = df['CIK'] % 2
+        return df
+
+    def supervised_batch(self, _range, jobs, callback = None, **pool_kwargs):
+        # like the pool, failed forms are left empty instead of raising
+        df = self.df.loc[_range, :].copy()
+        df['rus_attn'] = [
+            float('nan') if cik in self.fail_ciks else cik % 2
+            for cik in df['CIK']
+            ]
+        return df
+
+    def _finalise(self, output):
+        output = output.sort_values(by=['CIK', 'f_date'])
+        return output.reset_index(drop=True)
+
+def _claim_and_hang(work_dir:str, claimed):
+    runner = ShardRunner(LocalAttention(), work_dir, N_SHARDS, lease=LEASE)
+    runner.prepare()
+    claimed.put(runner.queue.claim('doomed'))
+    time.sleep(60)
+
+def _work(work_dir:str, owner:str, done):
+    runner = ShardRunner(LocalAttention(), work_dir, N_SHARDS, lease=LEASE)
+    done.put(runner.work(owner=owner))
+
+def test_reclaim_after_killed_worker(tmp_path):
+    work_dir = str(tmp_path)
+    ctx = mp.get_context('spawn')
+    claimed = ctx.Queue()
+    doomed = ctx.Process(target=_claim_and_hang, args=(work_dir, claimed))
+    doomed.start()
+    lost_shard = claimed.get(timeout=30)
+    doomed.kill()
+    doomed.join()
+    # let the lease of the killed worker expire
+    time.sleep(LEASE + 0.5)
+
+    done = ctx.Queue()
+    workers = [
+        ctx.Process(target=_work, args=(work_dir, 'worker{}'.format(i), done))
+        for i in range(2)
+        ]
+    for worker in workers:
+        worker.start()
+    done_shards = done.get(timeout=60) + done.get(timeout=60)
+    for worker in workers:
+        worker.join()
+
+    assert sorted(done_shards) == list(range(N_SHARDS))
+    conn = sqlite3.connect(os.path.join(work_dir, 'shards.sqlite'))
+    attempts = conn.execute(
+        'SELECT attempts FROM shards WHERE shard = ?', (lost_shard,)
+        ).fetchone()[0]
+    conn.close()
+    assert attempts == 2
+
+    runner = ShardRunner(LocalAttention(), work_dir, N_SHARDS, lease=LEASE)
+    output = runner.merge()
+    assert len(output) == 100
+    assert list(output['rus_attn']) == list(output['CIK'] % 2)
+
+@pytest.mark.parametrize('jobs', [None, 2])
+def test_failing_shard_is_not_claimed_forever(tmp_path, jobs):
+    attn = LocalAttention(fail_ciks=(1000,))
+    runner = ShardRunner(attn, str(tmp_path), N_SHARDS, lease=LEASE, max_attempts=2)
+    done = runner.work(owner='worker', jobs=jobs)
+
+    failed = runner.queue.shards('failed')
+    assert len(failed) == 1
+    assert runner.queue.status() == {'done': N_SHARDS - 1, 'failed': 1}
+    assert failed[0] not in done
+    with pytest.raises(RuntimeError, match='failed'):
+        runner.merge()
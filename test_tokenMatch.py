@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the tokenMatch module against the old list/Counter matching of
+bench_tokenMatch.py.
+'''
+import random
+import pytest
+from textNorm import tokenize
+from tokenMatch import PhraseMatcher
+from bench_tokenMatch import old_phrase_in_words, old_count_phrases
+
+DICT_PHRASES = [
+    ['russia'], ['russia*'], ['ukrain*'], ['sanction*'], ['war'],
+    ['war'], ['black', 'sea'], ['attack*', 'on', 'ukrain*'],
+    ['new', 'new'], ['a*', 'b*', 'c'],
+    ]
+WORDS = [
+    'russia', 'russian', 'ukraine', 'ukrainian', 'sanctions', 'war', 'warm',
+    'black', 'sea', 'attacks', 'attack', 'on', 'new', 'a', 'ab', 'b', 'bc',
+    'c', 'the', 'of', 'risk', 'income', 'blacksea', 'sea-level',
+    ]
+
+def make_text(rng, n_words:int)->str:
+    parts = []
+    for _ in range(n_words):
+        word = rng.choice(WORDS)
+        if rng.random() < 0.2:
+            word = word.upper() if rng.random() < 0.5 else word.capitalize()
+        parts.append(word + rng.choice(['', '', '', '.', ',', ';', ':', '?', '!']))
+        parts.append(rng.choice([' '] * 10 + ['\n', '\n\n', '  ', '\t', '  ']))
+    return ''.join(parts)
+
+@pytest.mark.parametrize('seed', range(200))
+def test_same_as_old_matching(seed):
+    rng = random.Random(seed)
+    text = make_text(rng, rng.randint(0, 60))
+    words = tokenize(text)
+    matcher = PhraseMatcher(DICT_PHRASES)
+    doc = matcher.encode(text)
+    assert len(doc) == len(words)
+    assert matcher.count(doc) == old_count_phrases(DICT_PHRASES, words)
+    assert matcher.contains(doc) == old_phrase_in_words(DICT_PHRASES, words)
+
+def test_vocabulary_is_kept_across_texts():
+    rng = random.Random(0)
+    matcher = PhraseMatcher(DICT_PHRASES, max_cache=10)
+    for _ in range(50):
+        text = make_text(rng, 40)
+        words = tokenize(text)
+        assert matcher.count(matcher.encode(text)) == old_count_phrases(DICT_PHRASES, words)
+    # only the words matching a dict word are interned
+    assert 'the' not in matcher.vocab and 'russia' in matcher.vocab
+    for word in matcher.vocab:
+        assert old_phrase_in_words([[w] for p in DICT_PHRASES for w in p], [word])
+
+def test_may_contain_ignores_order():
+    matcher = PhraseMatcher(DICT_PHRASES)
+    doc = matcher.encode('sea. The black cat')
+    assert not matcher.contains(doc)
+    assert matcher.may_contain(doc)
+    assert not matcher.may_contain(matcher.encode('The sea is calm'))
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+'''
+AUTHOR
+------
+    Goto Ryusuke (yuhang1012long@link.cuhk.edu.hk)
+    Find me at:
+        https://github.com/GotoRyusuke
+
+DESCRIPTION
+-----------
+Sparse token-ID representation for dict matching.
+
+A text is tokenised straight into integer IDs: the words are found one by
+one with a regex over the cleaned text, so the list of str words of a
+filing never exists. Only the words matching a dict word (or the prefix of
+a "*" wildcard) get an ID, through a vocabulary interned once per matcher
+and kept across texts; all other words only count towards the num of words.
+A TokenDoc thus saves the positions and the IDs of the dict words as NumPy
+int32 arrays, a few KB for a whole filing.
+
+Which dict words a word of the vocabulary matches, wildcards included, is
+worked out once when the word is interned; a phrase is then matched with
+vectorised comparisons on the positions of its words.
+
+STRUCTURE
+---------
+-<class> TokenDoc
+-<class> PhraseMatcher
+| -<method> _intern
+| -<method> _entry_ids
+| -<method> encode
+| -<method> _phrase_count
+| -<method> may_contain
+| -<method> contains
+| -<method> count
+-<END>
+
+'''
+import re
+import numpy as np
+from textNorm import clean_text
+
+# a word as split by textNorm.tokenize: no whitespace and no punct
+_WORD_PATTERN = re.compile(r'[^\s.,?!:;]+')
+
+class TokenDoc:
+    def __init__(self, n_words:int, pos, ids):
+        '''
+        Parametres
+        ----------
+        n_words: int
+            The num of words in the text.
+        pos: np.ndarray
+            The int32 positions of the dict words in the text.
+        ids: np.ndarray
+            The int32 IDs of these words in the vocabulary of the matcher.
+        '''
+        self.n_words = n_words
+        self.pos = pos
+        self.ids = ids
+
+    def __len__(self):
+        return self.n_words
+
+class PhraseMatcher:
+    def __init__(self, dict_phrases:list, max_cache:int = 2**16):
+        '''
+        Parametres
+        ----------
+        dict_phrases: list
+            A list of dict words/phrases. Ideally generated by
+            utils.load_dicts.
+        max_cache: int
+            Max num of words kept in the cache of looked-up words, which
+            halves the time of encode; the cache is cleared when it is
+            full. It takes abt 100 bytes per word, kept across texts.
+        '''
+        # every dict word is an entry: (word or prefix, is_prefix)
+        self.entries = {}
+        self.phrases = []
+        for phrase in dict_phrases:
+            if len(phrase) == 0:
+                continue
+            self.phrases.append(tuple(
+                self.entries.setdefault(
+                    (w.split('*')[0], True) if '*' in w else (w, False),
+                    len(self.entries),
+                    )
+                for w in phrase
+                ))
+        self.exact = {
+            word: e for (word, is_prefix), e in self.entries.items()
+            if not is_prefix
+            }
+        self.prefixes = {
+            word: e for (word, is_prefix), e in self.entries.items()
+            if is_prefix
+            }
+        self._prefix_tuple = tuple(self.prefixes)
+        # single-word phrases by entry, with duplicates in the dicts
+        self.n_single = [0] * len(self.entries)
+        for phrase in self.phrases:
+            if len(phrase) == 1:
+                self.n_single[phrase[0]] += 1
+        self.multi_phrases = [phrase for phrase in self.phrases if len(phrase) > 1]
+
+        # vocabulary of the dict words met so far; ID 0 is any other word
+        self.vocab = {}
+        self.word_entries = [frozenset()]
+        self.word_n_single = [0]
+        # raw word -> ID, to skip lower() and the prefix check
+        self.cache = {}
+        self.max_cache = max_cache
+        self._arrays = None
+
+    def _intern(self, word:str)->int:
+        '''
+        Get the ID of a lower-case word, interning it if it matches
+        a dict word; 0 if it does not.
+        '''
+        word_id = self.vocab.get(word)
+        if word_id is not None:
+            return word_id
+        if word not in self.exact and not word.startswith(self._prefix_tuple):
+            return 0
+        matched = {
+            e for prefix, e in self.prefixes.items()
+            if word.startswith(prefix)
+            }
+        if word in self.exact:
+            matched.add(self.exact[word])
+        word_id = len(self.word_entries)
+        self.vocab[word] = word_id
+        self.word_entries.append(frozenset(matched))
+        self.word_n_single.append(sum(self.n_single[e] for e in matched))
+        self._arrays = None
+        return word_id
+
+    def _entry_ids(self):
+        '''
+        Get the IDs of the vocabulary matching every entry, and the num of
+        single-word phrases matched by every ID, as arrays; rebuilt only
+        when the vocabulary has grown.
+        '''
+        if self._arrays is None:
+            entry_ids = [[] for _ in self.entries]
+            for word_id, matched in enumerate(self.word_entries):
+                for e in matched:
+                    entry_ids[e].append(word_id)
+            self._arrays = (
+                [np.array(ids, dtype=np.int32) for ids in entry_ids],
+                np.array(self.word_n_single, dtype=np.int64),
+                )
+        return self._arrays
+
+    def encode(self, text:str, cleaned:bool = False)->TokenDoc:
+        '''
+        Tokenise a text into a TokenDoc, with the same words as
+        textNorm.tokenize.
+
+        Parametres
+        ----------
+        text: str
+            The text to be processed.
+        cleaned: bool
+            Whether the text has been processed by textNorm.clean_text.
+
+        Return
+        ------
+        A TokenDoc of the text
+        '''
+        if not cleaned:
+            text = clean_text(text)
+        if len(self.cache) > self.max_cache:
+            self.cache.clear()
+        cache = self.cache
+        pos = []
+        ids = []
+        n_words = 0
+        for n_words, match in enumerate(_WORD_PATTERN.finditer(text), 1):
+            word = match.group()
+            word_id = cache.get(word)
+            if word_id is None:
+                word_id = cache[word] = self._intern(word.lower())
+            if word_id:
+                pos.append(n_words - 1)
+                ids.append(word_id)
+        return TokenDoc(
+            n_words,
+            np.array(pos, dtype=np.int32),
+            np.array(ids, dtype=np.int32),
+            )
+
+    def _phrase_count(self, phrase:tuple, doc:TokenDoc, entry_ids:list)->int:
+        # positions of the first word, then keep those followed by the others
+        start = doc.pos[np.isin(doc.ids, entry_ids[phrase[0]])]
+        for offset, e in enumerate(phrase[1:], 1):
+            if len(start) == 0:
+                return 0
+            target = start + offset
+            idx = np.searchsorted(doc.pos, target)
+            idx[idx == len(doc.pos)] = 0
+            start = start[
+                (doc.pos[idx] == target) & np.isin(doc.ids[idx], entry_ids[e])
+                ]
+        return len(start)
+
+    def may_contain(self, doc:TokenDoc)->bool:
+        '''
+        False if no dict word/phrase has all its words in the doc, else
+        True. Unlike contains, this ignores the order of words, so it
+        also holds for any text made of sentences of the doc.
+        '''
+        present = set()
+        for word_id in np.unique(doc.ids):
+            present |= self.word_entries[word_id]
+        return any(
+            all(e in present for e in phrase)
+            for phrase in self.phrases
+            )
+
+    def contains(self, doc:TokenDoc)->bool:
+        '''
+        False if no dict word/phrase is in the doc, else True
+        '''
+        if len(doc.ids) == 0:
+            return False
+        entry_ids, n_single = self._entry_ids()
+        if n_single[doc.ids].any():
+            return True
+        for phrase in self.multi_phrases:
+            if self._phrase_count(phrase, doc, entry_ids) > 0:
+                return True
+        return False
+
+    def count(self, doc:TokenDoc)->int:
+        '''
+        The total num of occurrences of all dict words/phrases in the doc
+        '''
+        if len(doc.ids) == 0:
+            return 0
+        entry_ids, n_single = self._entry_ids()
+        return int(n_single[doc.ids].sum()) + sum(
+            self._phrase_count(phrase, doc, entry_ids)
+            for phrase in self.multi_phrases
+            )
@@ -15,12 +15,13 @@ STRUCTURE
 -<func> load_dicts
 -<func> preprocess_text
 -<func> phrase_in_text
+-<func> sentence_hits
 -<func> cut_sentence
 -<func> cut_text_per_2000
 
 '''
-from collections import Counter
-import re
+from textNorm import tokenize
+from tokenMatch import PhraseMatcher
 
 def load_dicts(dict_path_list:str)->list:
     '''
@@ -68,13 +69,7 @@ def preprocess_text(text:str)->list:
     A list with each element a str of word in the text
     '''
 
-    text = re.sub(r'\n+', '. ', text)
-    text = re.sub(r'\s{2,}', '', text)
-    text = text.lower()
-    for punc in ['.',',','?','!',':',';']:
-        text = text.replace(punc, ' ')
-
-    return text.split()
+    return tokenize(text)
 
 def phrase_in_text(dict_phrases:list, text:str)->bool:
     '''
@@ -93,41 +88,32 @@ def phrase_in_text(dict_phrases:list, text:str)->bool:
     False if no dict word/phrase is detected, else True
     '''
 
-    # pre-process the text and get a list of words in it
-    text_words = preprocess_text(text)
-    # get the set of words in the text
-    words_counter = dict(Counter(text_words))
-    counter_keys = list(words_counter.keys())
-    
-    for phrase in dict_phrases:
-        # whether the dict phrase is a single word
-        if len(phrase) == 1:
-            kw = phrase[0]
-            # whether it is a lemma
-            if '*' not in kw:
-                if phrase[0] in words_counter.keys():
-                    return True
-            else:
-                kw = kw.split("*")[0]
-                for key in counter_keys:
-                    if key[:len(kw)] == kw:
-                        return True
-        else:
-            for w_i in range(len(text_words)):
-                flag = True
-                for p_w_i, p_w in enumerate(phrase):
-                    if '*' not in p_w:
-                        if w_i + p_w_i >= len(text_words) or p_w != text_words[w_i + p_w_i]:
-                            flag = False
-                            break
-                    else:
-                        p_w = p_w.split('*')[0]
-                        if w_i + p_w_i >= len(text_words) or p_w != text_words[w_i + p_w_i][:len(p_w)]:
-                            flag = False
-                            break
-                if flag:
-                    return flag
-    return False
+    matcher = PhraseMatcher(dict_phrases)
+    return matcher.contains(matcher.encode(text))
+
+def sentence_hits(dict_phrases:list, sentences:list)->list:
+    '''
+    Find the sentences containing dict words/phrases.
+
+    Parametres
+    ----------
+    dict_phrases: list
+        A list of dict words/phrases. Ideally generated by
+        load_dicts func.
+    sentences: list
+        A list of sentences.
+
+    Return
+    ------
+    A list of the indices of sentences with dict words/phrases
+    '''
+
+    matcher = PhraseMatcher(dict_phrases)
+    hits = []
+    for sent_i, sent in enumerate(sentences):
+        if matcher.contains(matcher.encode(sent)):
+            hits.append(sent_i)
+    return hits
 
 def cut_sentence(talk_content:str):
     talk_sentences = []